@@ -1,19 +1,89 @@
 import cv2
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import redis
+import json
+import os
+import threading
 import logging
-from pyzbar import pyzbar
+from cachetools import TLRUCache
+
+try:
+    from pyzbar import pyzbar
+except ImportError:  # pyzbar/libzbar is only needed for the fallback decoder
+    pyzbar = None
 
 logger = logging.getLogger(__name__)
 
+# Cache lifetimes for OpenFoodFacts lookups (seconds)
+PRODUCT_CACHE_TTL = 7 * 24 * 3600  # Found products rarely change
+NEGATIVE_CACHE_TTL = 3600  # Unknown barcodes may be added to the database later
+
+# Connect/read timeout for Redis (seconds); a slower Redis counts as a cache miss
+REDIS_TIMEOUT = 0.2
+
+# Translation tables for splitting ingredients and prettifying allergen tags
+_COMMA_TABLE = str.maketrans({';': ','})
+_DASH_TABLE = str.maketrans({'-': ' '})
+
+# Marks a barcode that OpenFoodFacts does not know about
+_NOT_FOUND = object()
+
+
+def _cache_ttu(barcode, value, now):
+    """Per-entry expiry for the in-memory cache."""
+    return now + (NEGATIVE_CACHE_TTL if value is _NOT_FOUND else PRODUCT_CACHE_TTL)
+
 
 class BarcodeService:
     """
     Handles barcode detection and product lookup via OpenFoodFacts API.
     """
     
-    def __init__(self):
+    # (nutrient, OpenFoodFacts keys in order of preference, unit)
+    _NUTRIENT_SPEC = (
+        ('protein', ('proteins_100g', 'proteins'), 'g'),
+        ('fat', ('fat_100g', 'fat'), 'g'),
+        ('saturated_fat', ('saturated-fat_100g', 'saturated-fat'), 'g'),
+        ('carbohydrates', ('carbohydrates_100g', 'carbohydrates'), 'g'),
+        ('sugars', ('sugars_100g', 'sugars'), 'g'),
+        ('fiber', ('fiber_100g', 'fiber'), 'g'),
+        ('sodium', ('sodium_100g', 'sodium'), 'mg'),
+        ('salt', ('salt_100g', 'salt'), 'mg'),
+    )
+    
+    def __init__(self, use_pyzbar_fallback=True, redis_url=None):
         self.api_base_url = "https://tr.openfoodfacts.org/api/v2/product"
+        
+        # Keep-alive HTTP session so repeated lookups reuse TLS connections
+        self.session = requests.Session()
+        self.session.headers.update({
+            # OpenFoodFacts asks API clients to identify themselves
+            "User-Agent": "FOOD_extractor/1.0 (https://github.com/Oguzhankokulu/FOOD_extractor)"
+        })
+        retry = Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        self.session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry))
+        
+        # Process-local cache of structured product data (first tier)
+        self._mem_cache = TLRUCache(maxsize=1024, ttu=_cache_ttu)
+        self._mem_lock = threading.Lock()
+        
+        # Shared Redis cache between workers (second tier, optional)
+        redis_url = redis_url or os.environ.get("REDIS_URL")
+        if redis_url:
+            self._redis = redis.Redis(connection_pool=redis.ConnectionPool.from_url(
+                redis_url, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT
+            ))
+        else:
+            self._redis = None
+        
+        # OpenCV's native 1D barcode detector (EAN/UPC), created once and reused
+        self._detector = cv2.barcode.BarcodeDetector()
+        
+        # Retry with pyzbar when OpenCV finds nothing (requires libzbar)
+        self.use_pyzbar_fallback = use_pyzbar_fallback and pyzbar is not None
     
     def detect_barcode(self, image):
         """
@@ -32,15 +102,24 @@ class BarcodeService:
             else:
                 gray = image
             
-            # Detect barcodes
-            barcodes = pyzbar.decode(gray)
+            # Detect barcodes (gray is passed as-is so OpenCV doesn't convert again)
+            ok, decoded_info, decoded_type, _ = self._detector.detectAndDecodeWithType(gray)
+            
+            if ok:
+                # Return the first barcode that was actually decoded
+                for barcode_data, barcode_type in zip(decoded_info, decoded_type):
+                    if barcode_data:
+                        logger.info(f"Barcode detected: {barcode_data} (Type: {barcode_type})")
+                        return barcode_data
             
-            if barcodes:
-                # Return the first barcode found
-                barcode_data = barcodes[0].data.decode('utf-8')
-                barcode_type = barcodes[0].type
-                logger.info(f"Barcode detected: {barcode_data} (Type: {barcode_type})")
-                return barcode_data
+            if self.use_pyzbar_fallback:
+                barcodes = pyzbar.decode(gray)
+                
+                if barcodes:
+                    barcode_data = barcodes[0].data.decode('utf-8')
+                    barcode_type = barcodes[0].type
+                    logger.info(f"Barcode detected by pyzbar: {barcode_data} (Type: {barcode_type})")
+                    return barcode_data
             
             logger.info("No barcode detected in image")
             return None
@@ -52,6 +131,8 @@ class BarcodeService:
     def get_product_info(self, barcode):
         """
         Fetch product information from OpenFoodFacts Turkey database.
+        Results are cached in memory and in Redis (when configured), including
+        short-lived entries for barcodes that are not in the database.
         
         Args:
             barcode: Barcode string
@@ -59,11 +140,41 @@ class BarcodeService:
         Returns:
             Dictionary with product information or None if not found
         """
+        with self._mem_lock:
+            cached = self._mem_cache.get(barcode)
+        if cached is not None:
+            logger.info(f"Product cache hit (memory): {barcode}")
+            return None if cached is _NOT_FOUND else cached
+        
+        cached = self._redis_get(barcode)
+        if cached is None:
+            cached = self._fetch_product_info(barcode)
+            if cached is None:
+                # Lookup failed (timeout, API error) - don't cache
+                return None
+            self._redis_set(barcode, cached)
+        else:
+            logger.info(f"Product cache hit (redis): {barcode}")
+        
+        with self._mem_lock:
+            self._mem_cache[barcode] = cached
+        
+        return None if cached is _NOT_FOUND else cached
+    
+    def _fetch_product_info(self, barcode):
+        """
+        Query the OpenFoodFacts API.
+        
+        Returns:
+            Structured product data, _NOT_FOUND if the barcode is unknown,
+            or None if the lookup itself failed
+        """
         try:
             url = f"{self.api_base_url}/{barcode}"
             logger.info(f"Fetching product from OpenFoodFacts: {url}")
             
-            response = requests.get(url, timeout=5)
+            # Separate connect/read timeouts
+            response = self.session.get(url, timeout=(1.0, 4.0))
             
             if response.status_code == 200:
                 data = response.json()
@@ -74,7 +185,10 @@ class BarcodeService:
                     return self._extract_product_data(product)
                 else:
                     logger.warning(f"Product not found for barcode: {barcode}")
-                    return None
+                    return _NOT_FOUND
+            elif response.status_code == 404:
+                logger.warning(f"Product not found for barcode: {barcode}")
+                return _NOT_FOUND
             else:
                 logger.warning(f"OpenFoodFacts API returned status {response.status_code}")
                 return None
@@ -86,6 +200,45 @@ class BarcodeService:
             logger.error(f"Error fetching product info: {str(e)}")
             return None
     
+    def _redis_get(self, barcode):
+        """
+        Read a cached lookup from Redis. Returns None on a miss, a Redis error
+        or a value that is not valid JSON.
+        """
+        if self._redis is None:
+            return None
+        
+        try:
+            raw = self._redis.get(f"off:{barcode}")
+        except redis.RedisError as e:
+            logger.warning(f"Redis read failed: {str(e)}")
+            return None
+        
+        if raw is None:
+            return None
+        
+        try:
+            product = json.loads(raw)
+        except ValueError as e:
+            logger.warning(f"Ignoring invalid Redis entry for {barcode}: {str(e)}")
+            return None
+        return _NOT_FOUND if product is None else product
+    
+    def _redis_set(self, barcode, product):
+        """
+        Store a lookup result in Redis (negative results get a shorter TTL).
+        """
+        if self._redis is None:
+            return
+        
+        try:
+            if product is _NOT_FOUND:
+                self._redis.setex(f"off:{barcode}", NEGATIVE_CACHE_TTL, json.dumps(None))
+            else:
+                self._redis.setex(f"off:{barcode}", PRODUCT_CACHE_TTL, json.dumps(product))
+        except redis.RedisError as e:
+            logger.warning(f"Redis write failed: {str(e)}")
+    
     def _extract_product_data(self, product):
         """
         Extract and structure product data from OpenFoodFacts response.
@@ -111,11 +264,14 @@ class BarcodeService:
         ingredients_list = []
         if ingredients_text:
             # Split by comma or semicolon
-            ingredients_list = [ing.strip() for ing in ingredients_text.replace(';', ',').split(',')]
+            ingredients_list = [
+                ing for ing in (part.strip() for part in ingredients_text.translate(_COMMA_TABLE).split(','))
+                if ing
+            ]
         
         # Extract allergens
         allergens_tags = product.get('allergens_tags', [])
-        allergens_list = [tag.replace('en:', '').replace('-', ' ') for tag in allergens_tags]
+        allergens_list = [tag.removeprefix('en:').translate(_DASH_TABLE) for tag in allergens_tags]
         
         # Build structured data
         structured_data = {
@@ -158,28 +314,13 @@ class BarcodeService:
         """
         nutrition = {}
         
-        # Mapping of nutrient names
-        nutrient_map = {
-            'protein': ['proteins_100g', 'proteins'],
-            'fat': ['fat_100g', 'fat'],
-            'saturated_fat': ['saturated-fat_100g', 'saturated-fat'],
-            'carbohydrates': ['carbohydrates_100g', 'carbohydrates'],
-            'sugars': ['sugars_100g', 'sugars'],
-            'fiber': ['fiber_100g', 'fiber'],
-            'sodium': ['sodium_100g', 'sodium'],
-            'salt': ['salt_100g', 'salt']
-        }
-        
-        for nutrient, keys in nutrient_map.items():
-            for key in keys:
-                value = nutriments.get(key)
-                if value is not None:
-                    unit = "mg" if nutrient in ['sodium', 'salt'] else "g"
-                    nutrition[nutrient] = {
-                        "value": value,
-                        "unit": unit
-                    }
-                    break
+        for nutrient, keys, unit in self._NUTRIENT_SPEC:
+            value = next((v for key in keys if (v := nutriments.get(key)) is not None), None)
+            if value is not None:
+                nutrition[nutrient] = {
+                    "value": value,
+                    "unit": unit
+                }
         
         return nutrition
     
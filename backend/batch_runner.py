@@ -0,0 +1,198 @@
+import cv2
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+from image_processor_advanced import ImageProcessorAdvanced
+from ocr_service_advanced import OCRServiceAdvanced
+from text_processor import TextProcessor
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the input on a stage queue
+_DONE = object()
+
+
+class BatchRunner:
+    """
+    Offline OCR for many images (e.g. a folder of package photos).
+    Preprocessing, OCR and text extraction run in their own threads connected
+    by bounded queues, so one image is preprocessed while the previous ones
+    are still in Tesseract.
+    """
+    
+    def __init__(self, image_processor=None, ocr_service=None, text_processor=None,
+                 queue_size=4, batch_size=4, batch_timeout=0.05):
+        """
+        Args:
+            image_processor: ImageProcessorAdvanced to use (new one if None)
+            ocr_service: OCRServiceAdvanced to use (new one if None)
+            text_processor: TextProcessor to use (new one if None)
+            queue_size: Maximum items waiting between two stages
+            batch_size: Images the OCR stage collects before running them together
+            batch_timeout: Seconds the OCR stage waits to fill a batch
+        """
+        self.image_processor = image_processor or ImageProcessorAdvanced()
+        self.ocr_service = ocr_service or OCRServiceAdvanced()
+        self.text_processor = text_processor or TextProcessor()
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+    
+    def run(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Process image files through the three stage pipeline.
+        
+        Args:
+            paths: Image file paths
+        
+        Returns:
+            One result per path, in input order, shaped like the
+            /upload-image OCR responses plus "filename"
+        """
+        to_ocr = queue.Queue(maxsize=self.queue_size)
+        to_text = queue.Queue(maxsize=self.queue_size)
+        results = []
+        
+        stages = [
+            threading.Thread(target=self._preprocess_stage, args=(paths, to_ocr), name='batch-preprocess'),
+            threading.Thread(target=self._ocr_stage, args=(to_ocr, to_text), name='batch-ocr'),
+            threading.Thread(target=self._text_stage, args=(to_text, results), name='batch-text'),
+        ]
+        
+        start = time.monotonic()
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+        
+        logger.info(f"Processed {len(results)} images in {time.monotonic() - start:.1f}s")
+        return [result for _, result in sorted(results, key=lambda item: item[0])]
+    
+    def _preprocess_stage(self, paths, out_queue):
+        """
+        Read each image and build its preprocessed variations.
+        """
+        try:
+            for index, path in enumerate(paths):
+                item = {'index': index, 'filename': path, 'error': None}
+                try:
+                    image = cv2.imread(path)
+                    if image is None:
+                        raise ValueError("Could not decode image")
+                    item['variations'] = self.image_processor.preprocess_multiple_methods(image)
+                except Exception as e:
+                    logger.error(f"Preprocessing failed for {path}: {str(e)}")
+                    item['error'] = f"Error processing image: {str(e)}"
+                out_queue.put(item)
+        finally:
+            out_queue.put(_DONE)
+    
+    def _ocr_stage(self, in_queue, out_queue):
+        """
+        Collect up to batch_size images (or whatever arrived within
+        batch_timeout) and OCR them concurrently.
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+                done = False
+                while not done:
+                    item = in_queue.get()
+                    if item is _DONE:
+                        break
+                    batch = [item]
+                    
+                    deadline = time.monotonic() + self.batch_timeout
+                    while len(batch) < self.batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            item = in_queue.get(timeout=remaining)
+                        except queue.Empty:
+                            break
+                        if item is _DONE:
+                            done = True
+                            break
+                        batch.append(item)
+                    
+                    for result in executor.map(self._ocr_item, batch):
+                        out_queue.put(result)
+        finally:
+            out_queue.put(_DONE)
+    
+    def _ocr_item(self, item):
+        if item['error'] is None:
+            try:
+                variations = item.pop('variations')
+                item['text'] = self.ocr_service.extract_text_robust(
+                    variations['shiny_optimized'], variations
+                )
+            except Exception as e:
+                logger.error(f"OCR failed for {item['filename']}: {str(e)}")
+                item['error'] = f"Error processing image: {str(e)}"
+        return item
+    
+    def _text_stage(self, in_queue, results):
+        """
+        Turn OCR text into structured food data.
+        """
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                break
+            
+            if item['error'] is not None:
+                result = {"success": False, "message": item['error'], "method": "ocr", "data": None}
+            elif not item['text'].strip():
+                result = {
+                    "success": False,
+                    "message": "No text detected in image",
+                    "method": "ocr",
+                    "data": None
+                }
+            else:
+                try:
+                    structured_data = self.text_processor.extract_food_data(item['text'])
+                    structured_data["source"] = "ocr"
+                    result = {
+                        "success": True,
+                        "message": "Image processed successfully via OCR",
+                        "method": "ocr",
+                        "data": structured_data,
+                        "raw_text": item['text'][:500]
+                    }
+                except Exception as e:
+                    logger.error(f"Text extraction failed for {item['filename']}: {str(e)}")
+                    result = {
+                        "success": False,
+                        "message": f"Error processing image: {str(e)}",
+                        "method": "ocr",
+                        "data": None
+                    }
+            
+            result["filename"] = item['filename']
+            results.append((item['index'], result))
+
+
+if __name__ == "__main__":
+    # Usage: python batch_runner.py <image or folder> [...]
+    logging.basicConfig(level=logging.INFO)
+    
+    paths = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            paths.extend(
+                os.path.join(arg, name) for name in sorted(os.listdir(arg))
+                if name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.webp'))
+            )
+        else:
+            paths.append(arg)
+    
+    print(json.dumps(BatchRunner().run(paths), indent=2, ensure_ascii=False))
@@ -1,5 +1,5 @@
 import cv2
-import numpy as np
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,16 +12,21 @@ class ImageProcessor:
     
     def __init__(self):
         self.target_width = 1500  # Resize to this width for better OCR
+        
+        # Per-thread CLAHE instance (see _get_clahe)
+        self._local = threading.local()
     
-    def preprocess(self, image):
+    def preprocess(self, image, denoise=False):
         """
         Apply preprocessing steps to enhance text visibility.
         
         Args:
             image: Input image as numpy array (BGR format)
+            denoise: Apply a light bilateral filter before CLAHE. Off by default;
+                CLAHE + adaptive thresholding already suppress most noise.
         
         Returns:
-            Preprocessed image ready for OCR
+            Preprocessed image ready for OCR (2D, C-contiguous uint8 array)
         """
         try:
             # Step 1: Resize image for better OCR (if too small or too large)
@@ -30,12 +35,12 @@ class ImageProcessor:
             # Step 2: Convert to grayscale
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             
-            # Step 3: Apply noise reduction
-            denoised = cv2.fastNlMeansDenoising(gray, h=10)
+            # Step 3: Optional noise reduction (bilateral is far cheaper than non-local means)
+            if denoise:
+                gray = cv2.bilateralFilter(gray, 5, 50, 50)
             
             # Step 4: Increase contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            contrast_enhanced = clahe.apply(denoised)
+            contrast_enhanced = self._get_clahe().apply(gray)
             
             # Step 5: Apply adaptive thresholding
             # This works better than simple thresholding for varying lighting conditions
@@ -48,19 +53,28 @@ class ImageProcessor:
                 2
             )
             
-            # Step 6: Morphological operations to remove small noise
-            kernel = np.ones((1, 1), np.uint8)
-            cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-            cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_OPEN, kernel)
+            # No morphological cleanup here: with a 1x1 kernel close/open leave
+            # the image unchanged and only cost two extra full-image passes.
             
             logger.info("Image preprocessing completed successfully")
-            return cleaned
+            return thresh
             
         except Exception as e:
             logger.error(f"Error in preprocessing: {str(e)}")
             # Return grayscale as fallback
             return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
+    def _get_clahe(self):
+        """
+        Return the CLAHE object for the calling thread.
+        Created once and reused; CLAHE keeps internal buffers, so an
+        instance is never shared between threads.
+        """
+        clahe = getattr(self._local, 'clahe', None)
+        if clahe is None:
+            clahe = self._local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        return clahe
+    
     def _resize_image(self, image):
         """
         Resize image to optimal size for OCR.
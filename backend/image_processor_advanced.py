@@ -1,9 +1,42 @@
 import cv2
 import numpy as np
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Structuring element for the final morphological cleanup
+MORPH_KERNEL = np.ones((2, 2), np.uint8)
+
+# check_image_quality measures on a thumbnail this wide
+QUALITY_THUMBNAIL_WIDTH = 512
+
+# Minimum Laplacian variance (on the thumbnail) for an image to count as sharp.
+# Downscaling raises the variance a lot, so the old full-size value of 100
+# would almost never fire here. Calibrated on synthetic labels (1200-4032 px
+# wide, several text sizes) blurred by sigma = k * width / 2000: 1500 flags
+# most k >= 2 images (a 2000 px photo the old full-size check called blurry)
+# and almost none with k <= 1. Higher values start flagging sharp photos with
+# small print, which the thumbnail can't resolve.
+BLUR_THRESHOLD = 1500
+
+# CLAHE settings (clipLimit, tileGridSize) used by the different pipelines
+CLAHE_SETTINGS = {
+    'shiny': (3.0, (8, 8)),  # Glare removal and shiny packages
+    'std': (2.0, (8, 8)),    # Standard pipeline
+    'high': (4.0, (4, 4)),   # High contrast pipeline for faded text
+}
+
+
+def _cuda_available():
+    """
+    True if this OpenCV build has CUDA support and a CUDA device is present.
+    """
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
 
 class ImageProcessorAdvanced:
     """
@@ -13,6 +46,20 @@ class ImageProcessorAdvanced:
     
     def __init__(self):
         self.target_width = 1500
+        
+        # Per-thread CLAHE instances and scratch buffers (see _get_clahe, _get_buffer)
+        self._local = threading.local()
+        
+        # Optional GPU path for the shiny package filters (OpenCV built with CUDA)
+        self._use_cuda = _cuda_available()
+        if self._use_cuda:
+            clip_limit, tile_grid_size = CLAHE_SETTINGS['shiny']
+            self._cuda_clahe = cv2.cuda.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+            self._cuda_gaussian = cv2.cuda.createGaussianFilter(cv2.CV_8UC1, cv2.CV_8UC1, (13, 13), 2.0)
+            self._cuda_stream = cv2.cuda_Stream()
+            # The filters and stream are shared, so GPU work is serialized
+            self._cuda_lock = threading.Lock()
+            logger.info("CUDA device found, using GPU preprocessing")
     
     def preprocess(self, image):
         """
@@ -38,26 +85,25 @@ class ImageProcessorAdvanced:
         Returns:
             Preprocessed image ready for OCR
         """
+        # Step 1: Resize
+        image = self._resize_image(image)
+        return self._shiny_from_resized(image)
+    
+    def _shiny_from_resized(self, image):
+        """
+        Shiny package pipeline on an already resized image.
+        Starts from the color image because glare removal needs it.
+        """
         try:
-            # Step 1: Resize
-            image = self._resize_image(image)
-            
-            # Step 2: Remove glare (if color image)
-            if len(image.shape) == 3:
-                image = self._remove_glare(image)
-            
-            # Step 3: Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Step 4: Bilateral filter (better edge preservation than NLM)
-            denoised = cv2.bilateralFilter(gray, d=9, sigmaColor=75, sigmaSpace=75)
-            
-            # Step 5: Aggressive CLAHE for shiny surfaces
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(denoised)
-            
-            # Step 6: Unsharp masking (sharpen text edges)
-            sharpened = self._unsharp_mask(enhanced)
+            # Steps 2-6 on the GPU when available, otherwise on the CPU
+            sharpened = None
+            if self._use_cuda:
+                try:
+                    sharpened = self._shiny_filters_cuda(image)
+                except cv2.error as e:
+                    logger.warning(f"CUDA preprocessing failed, using CPU: {str(e)}")
+            if sharpened is None:
+                sharpened = self._shiny_filters(image)
             
             # Step 7: Adaptive thresholding with larger block size
             thresh = cv2.adaptiveThreshold(
@@ -73,9 +119,8 @@ class ImageProcessorAdvanced:
             deskewed = self._deskew_image(thresh)
             
             # Step 9: Morphological cleaning
-            kernel = np.ones((2, 2), np.uint8)
-            cleaned = cv2.morphologyEx(deskewed, cv2.MORPH_CLOSE, kernel)
-            cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_OPEN, kernel)
+            cleaned = cv2.morphologyEx(deskewed, cv2.MORPH_CLOSE, MORPH_KERNEL)
+            cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_OPEN, MORPH_KERNEL)
             
             logger.info("Advanced preprocessing completed successfully")
             return cleaned
@@ -85,6 +130,65 @@ class ImageProcessorAdvanced:
             # Fallback to basic grayscale
             return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
+    def _shiny_filters(self, image):
+        """
+        Glare removal, denoising, contrast and sharpening steps of the
+        shiny package pipeline (CPU).
+        """
+        # Step 2: Remove glare (if color image)
+        if len(image.shape) == 3:
+            image = self._remove_glare(image)
+        
+        # Step 3: Convert to grayscale
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        # Step 4: Bilateral filter (better edge preservation than NLM)
+        denoised = cv2.bilateralFilter(gray, d=9, sigmaColor=75, sigmaSpace=75)
+        
+        # Step 5: Aggressive CLAHE for shiny surfaces
+        enhanced = self._get_clahe('shiny').apply(denoised)
+        
+        # Step 6: Unsharp masking (sharpen text edges)
+        return self._unsharp_mask(enhanced)
+    
+    def _shiny_filters_cuda(self, image):
+        """
+        Same steps as _shiny_filters, run with cv2.cuda. The image is uploaded
+        once and stays in device memory until the sharpened result is
+        downloaded for thresholding (which has no CUDA implementation).
+        """
+        with self._cuda_lock:
+            stream = self._cuda_stream
+            
+            gpu_image = cv2.cuda_GpuMat()
+            gpu_image.upload(image, stream)
+            
+            # Steps 2-3: Glare removal on the L channel, then grayscale
+            if len(image.shape) == 3:
+                lab = cv2.cuda.cvtColor(gpu_image, cv2.COLOR_BGR2LAB, stream=stream)
+                l, a, b = cv2.cuda.split(lab, stream=stream)
+                l = self._cuda_clahe.apply(l, stream)
+                lab = cv2.cuda.merge([l, a, b], stream=stream)
+                bgr = cv2.cuda.cvtColor(lab, cv2.COLOR_LAB2BGR, stream=stream)
+                gray = cv2.cuda.cvtColor(bgr, cv2.COLOR_BGR2GRAY, stream=stream)
+            else:
+                gray = gpu_image
+            
+            # Step 4: Bilateral filter
+            denoised = cv2.cuda.bilateralFilter(gray, 9, 75, 75, stream=stream)
+            
+            # Step 5: Aggressive CLAHE
+            enhanced = self._cuda_clahe.apply(denoised, stream)
+            
+            # Step 6: Unsharp masking (same weights as _unsharp_mask defaults)
+            blurred = self._cuda_gaussian.apply(enhanced, stream=stream)
+            sharpened = cv2.cuda.addWeighted(enhanced, 1.5, blurred, -0.5, 0, stream=stream)
+            
+            result = sharpened.download(stream)
+            stream.waitForCompletion()
+        
+        return result
+    
     def preprocess_multiple_methods(self, image):
         """
         Generate multiple preprocessed versions for multi-pass OCR.
@@ -98,20 +202,23 @@ class ImageProcessorAdvanced:
         """
         results = {}
         
+        # Resize and convert to grayscale once; every method below starts from these
+        resized = self._resize_image(image)
+        gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+        
         # Method 1: Optimized for shiny packages
-        results['shiny_optimized'] = self.preprocess_shiny_package(image)
+        results['shiny_optimized'] = self._shiny_from_resized(resized)
         
         # Method 2: Standard preprocessing
-        results['standard'] = self._standard_preprocess(image)
+        results['standard'] = self._standard_from_gray(gray)
         
         # Method 3: High contrast
-        results['high_contrast'] = self._high_contrast_preprocess(image)
+        results['high_contrast'] = self._high_contrast_from_gray(gray)
         
         # Method 4: Inverted (for light text on dark background)
         results['inverted'] = cv2.bitwise_not(results['standard'])
         
         # Method 5: Multiple thresholds
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Otsu's method
         _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
@@ -135,8 +242,7 @@ class ImageProcessorAdvanced:
         l, a, b = cv2.split(lab)
         
         # Apply CLAHE only to L channel (brightness)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
+        l = self._get_clahe('shiny').apply(l)
         
         # Merge back and convert to BGR
         lab = cv2.merge([l, a, b])
@@ -145,19 +251,34 @@ class ImageProcessorAdvanced:
         logger.info("Glare removal applied")
         return result
     
+    def _get_clahe(self, name):
+        """
+        Return the CLAHE object for the given setting and the calling thread.
+        Created once and reused; CLAHE keeps internal buffers, so an
+        instance is never shared between threads.
+        """
+        clahe = getattr(self._local, name, None)
+        if clahe is None:
+            clip_limit, tile_grid_size = CLAHE_SETTINGS[name]
+            clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+            setattr(self._local, name, clahe)
+        return clahe
+    
     def _deskew_image(self, image):
         """
         Automatically detect and correct image rotation/skew.
         Tesseract works best with horizontal text.
         """
-        # Find all non-zero points
-        coords = np.column_stack(np.where(image > 0))
+        # Find non-zero points on a quarter-size mask; the skew angle is
+        # scale invariant and minAreaRect gets ~16x fewer points
+        small = cv2.resize(image, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_NEAREST)
+        coords = cv2.findNonZero(small)
         
-        if len(coords) == 0:
+        if coords is None:
             return image
         
-        # Get rotation angle
-        angle = cv2.minAreaRect(coords)[-1]
+        # Get rotation angle (points as (row, col), matching the angle convention below)
+        angle = cv2.minAreaRect(np.ascontiguousarray(coords[:, 0, ::-1]))[-1]
         
         # Adjust angle
         if angle < -45:
@@ -185,15 +306,34 @@ class ImageProcessorAdvanced:
     def _unsharp_mask(self, image, sigma=2.0, strength=1.5):
         """
         Sharpen image to enhance text edges.
+        Writes into per-thread scratch buffers, so the returned array is only
+        valid until the next call on the same thread.
         """
+        blur_buf = self._get_buffer('blur', image)
+        sharp_buf = self._get_buffer('sharp', image)
+        
+        # Same kernel size OpenCV derives from sigma for 8-bit images
+        ksize = int(round(sigma * 6 + 1)) | 1
+        
         # Create blurred version
-        blurred = cv2.GaussianBlur(image, (0, 0), sigma)
+        blurred = cv2.GaussianBlur(image, (ksize, ksize), sigma, dst=blur_buf)
         
         # Sharpened = Original + (Original - Blurred) * strength
-        sharpened = cv2.addWeighted(image, strength, blurred, -strength + 1, 0)
+        sharpened = cv2.addWeighted(image, strength, blurred, -strength + 1, 0, dst=sharp_buf)
         
         return sharpened
     
+    def _get_buffer(self, name, like):
+        """
+        Return a scratch buffer for the calling thread with the same shape
+        and dtype as `like`, reallocating only when the size changes.
+        """
+        buf = getattr(self._local, f'{name}_buf', None)
+        if buf is None or buf.shape != like.shape or buf.dtype != like.dtype:
+            buf = np.empty_like(like)
+            setattr(self._local, f'{name}_buf', buf)
+        return buf
+    
     def _resize_image(self, image):
         """
         Resize image to optimal size for OCR.
@@ -217,10 +357,15 @@ class ImageProcessorAdvanced:
         """
         image = self._resize_image(image)
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return self._standard_from_gray(gray)
+    
+    def _standard_from_gray(self, gray):
+        """
+        Standard pipeline on an already resized grayscale image.
+        """
         denoised = cv2.fastNlMeansDenoising(gray, h=10)
         
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        contrast_enhanced = clahe.apply(denoised)
+        contrast_enhanced = self._get_clahe('std').apply(denoised)
         
         thresh = cv2.adaptiveThreshold(
             contrast_enhanced, 255,
@@ -228,11 +373,8 @@ class ImageProcessorAdvanced:
             cv2.THRESH_BINARY, 11, 2
         )
         
-        kernel = np.ones((1, 1), np.uint8)
-        cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_OPEN, kernel)
-        
-        return cleaned
+        # 1x1 close/open would be a no-op, so the threshold output is final
+        return thresh
     
     def _high_contrast_preprocess(self, image):
         """
@@ -240,10 +382,14 @@ class ImageProcessorAdvanced:
         """
         image = self._resize_image(image)
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
+        return self._high_contrast_from_gray(gray)
+    
+    def _high_contrast_from_gray(self, gray):
+        """
+        High contrast pipeline on an already resized grayscale image.
+        """
         # Very aggressive CLAHE
-        clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(4, 4))
-        enhanced = clahe.apply(gray)
+        enhanced = self._get_clahe('high').apply(gray)
         
         # Sharpen
         sharpened = self._unsharp_mask(enhanced, sigma=1.5, strength=2.0)
@@ -256,44 +402,56 @@ class ImageProcessorAdvanced:
     def check_image_quality(self, image):
         """
         Check if image is suitable for OCR and provide feedback.
+        Metrics are computed on a thumbnail at most QUALITY_THUMBNAIL_WIDTH wide.
         
         Returns:
             Dictionary with quality metrics and issues
         """
         issues = []
         
+        # Measure on a small thumbnail; brightness, contrast and focus don't
+        # need full resolution
+        height, width = image.shape[:2]
+        if width > QUALITY_THUMBNAIL_WIDTH:
+            thumb_height = max(1, int(QUALITY_THUMBNAIL_WIDTH * height / width))
+            small = cv2.resize(image, (QUALITY_THUMBNAIL_WIDTH, thumb_height), interpolation=cv2.INTER_AREA)
+        else:
+            small = image
+        
         # Convert to grayscale if needed
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if len(small.shape) == 3:
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
         else:
-            gray = image
+            gray = small
+        
+        # Brightness and contrast in one pass
+        mean, std = cv2.meanStdDev(gray)
+        mean_brightness = float(mean[0][0])
+        contrast = float(std[0][0])
         
         # Check brightness
-        mean_brightness = np.mean(gray)
         if mean_brightness < 40:
             issues.append("Image too dark - use better lighting")
         elif mean_brightness > 215:
             issues.append("Image too bright/overexposed - reduce lighting")
         
-        # Check blur (Laplacian variance)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        if laplacian_var < 100:
+        # Check blur (Laplacian variance; int16 holds the 8-bit Laplacian exactly)
+        laplacian_var = float(cv2.Laplacian(gray, cv2.CV_16S).var())
+        if laplacian_var < BLUR_THRESHOLD:
             issues.append("Image too blurry - hold camera steady and focus on text")
         
         # Check contrast
-        contrast = gray.std()
         if contrast < 30:
             issues.append("Low contrast - improve lighting or try different angle")
         
-        # Check resolution
-        height, width = gray.shape
+        # Check resolution (of the original image)
         if width < 800 or height < 600:
             issues.append("Image resolution too low - get closer to the text")
         
         quality_score = 100
         if mean_brightness < 40 or mean_brightness > 215:
             quality_score -= 30
-        if laplacian_var < 100:
+        if laplacian_var < BLUR_THRESHOLD:
             quality_score -= 40
         if contrast < 30:
             quality_score -= 20
@@ -6,9 +6,13 @@ import cv2
 import numpy as np
 from PIL import Image
 import io
+import os
+import asyncio
 import logging
+from typing import List
 
 from image_processor import ImageProcessor
+from image_processor_advanced import ImageProcessorAdvanced
 from ocr_service import OCRService
 from text_processor import TextProcessor
 from barcode_service import BarcodeService
@@ -30,10 +34,46 @@ app.add_middleware(
 
 # Initialize services
 image_processor = ImageProcessor()
+image_processor_advanced = ImageProcessorAdvanced()  # Used for image quality checks
 ocr_service = OCRService()
 text_processor = TextProcessor()
 barcode_service = BarcodeService()
 
+# Images scoring below this in check_image_quality are not sent to OCR
+MIN_OCR_QUALITY_SCORE = 30
+
+# How many images of a /upload-images batch are processed at the same time
+BATCH_CONCURRENCY = min(8, os.cpu_count() or 1)
+
+# Uploads whose longer side is at least this are decoded at half size; the
+# result is still at least the OCR target width (1500 px)
+REDUCED_DECODE_MIN_SIZE = 3000
+
+
+def _decode_image(contents):
+    """
+    Decode an uploaded image for barcode detection and OCR.
+    Large photos (longer side >= REDUCED_DECODE_MIN_SIZE) are decoded at half
+    size (libjpeg scales in the DCT domain, so this is cheaper than a full
+    decode); they would be downscaled to the OCR target width anyway. The size
+    is read from the image header, so every upload is decoded only once.
+    
+    Returns:
+        BGR image as numpy array, or None if the data is not a valid image
+    """
+    try:
+        # Only parses the header, the pixels are not decoded
+        width, height = Image.open(io.BytesIO(contents)).size
+    except Exception:
+        # Format PIL can't read; let OpenCV decode it at full size
+        width = height = 0
+    
+    if max(width, height) >= REDUCED_DECODE_MIN_SIZE:
+        flags = cv2.IMREAD_REDUCED_COLOR_2
+    else:
+        flags = cv2.IMREAD_COLOR
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), flags)
+
 
 @app.get("/")
 async def root():
@@ -41,6 +81,108 @@ async def root():
     return {"message": "Food Package OCR API is running", "status": "healthy"}
 
 
+async def _process_image(file):
+    """
+    Run the barcode + OCR pipeline on one uploaded file.
+    
+    Args:
+        file: Uploaded image file
+    
+    Returns:
+        Response payload as a dictionary
+    
+    Raises:
+        HTTPException: If the file is not a valid image
+    """
+    # Validate file type
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    logger.info(f"Processing image: {file.filename}")
+    
+    # Read image file
+    contents = await file.read()
+    
+    # Decode the image (CPU-bound, keep it off the event loop)
+    image = await asyncio.to_thread(_decode_image, contents)
+    
+    if image is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    
+    # Step 1: Try barcode scanning first (it tolerates poor images, so it always runs)
+    logger.info("Attempting barcode detection...")
+    barcode_task = asyncio.create_task(asyncio.to_thread(barcode_service.scan_and_fetch, image))
+    
+    # Meanwhile check whether OCR is worth attempting. If so, OCR preprocessing
+    # is started speculatively so the no-barcode path doesn't pay for both
+    # steps back to back.
+    quality = await asyncio.to_thread(image_processor_advanced.check_image_quality, image)
+    if quality['quality_score'] >= MIN_OCR_QUALITY_SCORE:
+        prep_task = asyncio.create_task(asyncio.to_thread(image_processor.preprocess, image))
+    else:
+        prep_task = None
+    
+    barcode_data = await barcode_task
+    
+    if barcode_data:
+        # The worker thread can't be interrupted; this just drops the result
+        if prep_task is not None:
+            prep_task.cancel()
+        logger.info("Product found via barcode!")
+        return {
+            "success": True,
+            "message": "Product found via barcode from OpenFoodFacts",
+            "method": "barcode",
+            "data": barcode_data
+        }
+    
+    # Step 2: No barcode found, fall back to OCR unless the image is unusable
+    if prep_task is None:
+        logger.warning(
+            f"Skipping OCR, image quality score {quality['quality_score']} "
+            f"below {MIN_OCR_QUALITY_SCORE}: {quality['issues']}"
+        )
+        return {
+            "success": False,
+            "message": "No barcode found and image quality is too low for OCR: " + "; ".join(quality['issues']),
+            "method": "ocr",
+            "data": None,
+            "issues": quality['issues']
+        }
+    
+    logger.info("No barcode found, falling back to OCR...")
+    
+    # Step 2a: Wait for the preprocessed image
+    logger.info("Preprocessing image...")
+    processed_image = await prep_task
+    
+    # Step 2b: Perform OCR with Turkish + English
+    logger.info("Performing OCR (Turkish + English)...")
+    raw_text = await asyncio.to_thread(ocr_service.extract_text, processed_image)
+    
+    if not raw_text.strip():
+        return {
+            "success": False,
+            "message": "No barcode found and no text detected in image",
+            "method": "ocr",
+            "data": None
+        }
+    
+    # Step 2c: Post-process and extract structured data
+    logger.info("Extracting structured data from OCR...")
+    structured_data = text_processor.extract_food_data(raw_text)
+    structured_data["source"] = "ocr"
+    
+    logger.info("OCR processing complete")
+    return {
+        "success": True,
+        "message": "Image processed successfully via OCR",
+        "method": "ocr",
+        "data": structured_data,
+        "raw_text": raw_text[:500]  # Include first 500 chars of raw text for debugging
+    }
+
+
 @app.post("/upload-image")
 async def upload_image(file: UploadFile = File(...)):
     """
@@ -54,67 +196,7 @@ async def upload_image(file: UploadFile = File(...)):
         JSON containing extracted ingredients and nutritional information
     """
     try:
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        logger.info(f"Processing image: {file.filename}")
-        
-        # Read image file
-        contents = await file.read()
-        
-        # Convert to numpy array
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise HTTPException(status_code=400, detail="Invalid image file")
-        
-        # Step 1: Try barcode scanning first
-        logger.info("Attempting barcode detection...")
-        barcode_data = barcode_service.scan_and_fetch(image)
-        
-        if barcode_data:
-            logger.info("Product found via barcode!")
-            return JSONResponse(content={
-                "success": True,
-                "message": "Product found via barcode from OpenFoodFacts",
-                "method": "barcode",
-                "data": barcode_data
-            })
-        
-        # Step 2: No barcode found, fall back to OCR
-        logger.info("No barcode found, falling back to OCR...")
-        
-        # Step 2a: Preprocess image
-        logger.info("Preprocessing image...")
-        processed_image = image_processor.preprocess(image)
-        
-        # Step 2b: Perform OCR with Turkish + English
-        logger.info("Performing OCR (Turkish + English)...")
-        raw_text = ocr_service.extract_text(processed_image)
-        
-        if not raw_text.strip():
-            return JSONResponse(content={
-                "success": False,
-                "message": "No barcode found and no text detected in image",
-                "method": "ocr",
-                "data": None
-            })
-        
-        # Step 2c: Post-process and extract structured data
-        logger.info("Extracting structured data from OCR...")
-        structured_data = text_processor.extract_food_data(raw_text)
-        structured_data["source"] = "ocr"
-        
-        logger.info("OCR processing complete")
-        return JSONResponse(content={
-            "success": True,
-            "message": "Image processed successfully via OCR",
-            "method": "ocr",
-            "data": structured_data,
-            "raw_text": raw_text[:500]  # Include first 500 chars of raw text for debugging
-        })
+        return JSONResponse(content=await _process_image(file))
         
     except HTTPException:
         raise
@@ -123,5 +205,47 @@ async def upload_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
+@app.post("/upload-images")
+async def upload_images(files: List[UploadFile] = File(...)):
+    """
+    Upload several food package images in one request.
+    Each image goes through the same pipeline as /upload-image, with up to
+    BATCH_CONCURRENCY images in flight at once. Barcode lookups share the
+    BarcodeService HTTP session, so connections are reused across the batch.
+    
+    Args:
+        files: Image files (jpg, png, etc.)
+    
+    Returns:
+        JSON with one result per file, in upload order
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def process_one(file):
+        async with semaphore:
+            try:
+                result = await _process_image(file)
+            except HTTPException as e:
+                result = {"success": False, "message": e.detail, "method": None, "data": None}
+            except Exception as e:
+                logger.error(f"Error processing image {file.filename}: {str(e)}", exc_info=True)
+                result = {
+                    "success": False,
+                    "message": f"Error processing image: {str(e)}",
+                    "method": None,
+                    "data": None
+                }
+        result["filename"] = file.filename
+        return result
+    
+    results = await asyncio.gather(*(process_one(file) for file in files))
+    
+    return JSONResponse(content={
+        "success": any(result["success"] for result in results),
+        "count": len(results),
+        "results": results
+    })
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,7 +1,11 @@
 import pytesseract
 from PIL import Image
 import numpy as np
+import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from tesseract_utils import PyTessBaseAPI, PSM, EnginePool, summarize_data
 
 logger = logging.getLogger(__name__)
 
@@ -20,26 +24,55 @@ class OCRService:
         # --psm 6: Assume a single uniform block of text
         # -l tur+eng: Use Turkish and English languages
         self.config = '--oem 3 --psm 6 -l tur+eng'
+        
+        # Tesseract runs in a subprocess, so threads are enough to OCR several
+        # variants at once (each subprocess is single-threaded, see tesseract_utils)
+        workers = max(1, (os.cpu_count() or 2) // 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        
+        # With tesserocr installed, extract_text borrows a loaded Tesseract
+        # engine (Turkish + English, like self.config) instead of spawning a
+        # subprocess per call. Each engine holds its own language models, so
+        # no more are loaded than the executor has workers.
+        self.use_tesserocr = PyTessBaseAPI is not None
+        self._engines = EnginePool('tur+eng', workers)
     
     def extract_text(self, image):
         """
         Extract text from preprocessed image using Tesseract OCR.
         
         Args:
-            image: Preprocessed image (numpy array)
+            image: Preprocessed image (numpy array). A 2D uint8 array takes
+                the fastest path.
         
         Returns:
             Extracted text as string
         """
         try:
-            # Convert numpy array to PIL Image for pytesseract
             if isinstance(image, np.ndarray):
-                pil_image = Image.fromarray(image)
-            else:
-                pil_image = image
+                # Contiguous buffers let PIL wrap the data without another copy
+                image = np.ascontiguousarray(image)
             
-            # Perform OCR
-            text = pytesseract.image_to_string(pil_image, config=self.config)
+            if self.use_tesserocr and isinstance(image, np.ndarray) and image.ndim == 2 and image.dtype == np.uint8:
+                # Grayscale buffer goes straight to Tesseract, no PIL image or encode
+                height, width = image.shape
+                with self._engines.engine(PSM.SINGLE_BLOCK) as api:
+                    api.SetImageBytes(image.tobytes(), width, height, 1, width)
+                    text = api.GetUTF8Text()
+            else:
+                # Convert numpy array to PIL Image for pytesseract
+                if isinstance(image, np.ndarray):
+                    pil_image = Image.fromarray(image)
+                else:
+                    pil_image = image
+                
+                # Perform OCR
+                if self.use_tesserocr:
+                    with self._engines.engine(PSM.SINGLE_BLOCK) as api:
+                        api.SetImage(pil_image)
+                        text = api.GetUTF8Text()
+                else:
+                    text = pytesseract.image_to_string(pil_image, config=self.config)
             
             logger.info(f"OCR extracted {len(text)} characters")
             return text
@@ -48,6 +81,56 @@ class OCRService:
             logger.error(f"Error during OCR: {str(e)}")
             raise Exception(f"OCR failed: {str(e)}")
     
+    def extract_text_best(self, variants):
+        """
+        Run OCR on several preprocessed versions of an image in parallel
+        and return the one Tesseract is most confident about.
+        
+        Args:
+            variants: Dictionary of method name -> preprocessed image
+                (e.g. from ImageProcessor.preprocess_multiple_methods)
+        
+        Returns:
+            Dictionary with text, mean confidence and method of the best variant
+        """
+        futures = {
+            name: self._executor.submit(self._ocr_variant, image)
+            for name, image in variants.items()
+        }
+        
+        best = {'text': '', 'confidence': 0.0, 'method': None}
+        for name, future in futures.items():
+            try:
+                text, confidence = future.result()
+            except Exception as e:
+                logger.error(f"OCR failed for variant {name}: {str(e)}")
+                continue
+            
+            if best['method'] is None or confidence > best['confidence']:
+                best = {'text': text, 'confidence': confidence, 'method': name}
+        
+        logger.info(f"Best OCR variant: {best['method']} ({best['confidence']:.1f}% confidence)")
+        return best
+    
+    def _ocr_variant(self, image):
+        """
+        OCR one variant with a single Tesseract call.
+        
+        Returns:
+            Tuple of (text, mean word confidence)
+        """
+        if isinstance(image, np.ndarray):
+            pil_image = Image.fromarray(image)
+        else:
+            pil_image = image
+        
+        data = pytesseract.image_to_data(pil_image, config=self.config, output_type=pytesseract.Output.DICT)
+        
+        # Rebuild the text line by line from the word boxes
+        text, confidences, _ = summarize_data(data)
+        confidence = float(confidences.mean()) if confidences.size else 0.0
+        return text, confidence
+    
     def extract_text_with_confidence(self, image):
         """
         Extract text with confidence scores and bounding boxes.
@@ -68,13 +151,10 @@ class OCRService:
             # Get detailed OCR data
             data = pytesseract.image_to_data(pil_image, config=self.config, output_type=pytesseract.Output.DICT)
             
-            # Filter out low confidence detections
-            filtered_text = []
-            for i, conf in enumerate(data['conf']):
-                if int(conf) > 30:  # Only keep text with >30% confidence
-                    text = data['text'][i].strip()
-                    if text:
-                        filtered_text.append(text)
+            # Filter out low confidence detections (only keep text with >30% confidence)
+            conf = np.asarray(data['conf'], dtype=np.int16)
+            words = np.char.strip(np.asarray(data['text'], dtype=str))
+            filtered_text = words[(conf > 30) & (words != '')].tolist()
             
             return {
                 'text': ' '.join(filtered_text),
@@ -84,9 +164,9 @@ class OCRService:
             
         except Exception as e:
             logger.error(f"Error during detailed OCR: {str(e)}")
-            # Fallback to simple extraction
+            # Don't OCR the same image a second time after a failure
             return {
-                'text': self.extract_text(image),
+                'text': '',
                 'full_data': None,
                 'word_count': 0
             }
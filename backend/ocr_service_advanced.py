@@ -1,10 +1,93 @@
 import pytesseract
 from PIL import Image
 import numpy as np
+import cv2
+import io
+import os
+import asyncio
+import threading
+import hashlib
+import shutil
+import subprocess
+import tempfile
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tesseract_utils import (
+    PyTessBaseAPI, EnginePool, parse_tsv, positive_confidences, strip_words, summarize_data
+)
+
+try:
+    # Optional faster hash for the OCR result cache (pip install xxhash)
+    import xxhash
+except ImportError:
+    xxhash = None
 
 logger = logging.getLogger(__name__)
 
+# Images with fewer pixels than this (32x32) are too small to OCR
+MIN_OCR_PIXELS = 32 * 32
+
+# Batch OCR writes its images to RAM-backed storage when available
+_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def _to_gray_pil(image):
+    """
+    Return image as a single-channel 8-bit PIL image. Color numpy arrays are
+    taken to be OpenCV BGR(A).
+    """
+    if isinstance(image, Image.Image):
+        return image if image.mode == 'L' else image.convert('L')
+    if image.ndim == 3:
+        code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        image = cv2.cvtColor(image, code)
+    return Image.fromarray(image)
+
+
+def _remove_when_done(futures, path):
+    """
+    Delete the directory at path once all futures are finished or cancelled.
+    """
+    remaining = [len(futures)]
+    lock = threading.Lock()
+    
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    if not futures:
+        shutil.rmtree(path, ignore_errors=True)
+    for future in futures:
+        future.add_done_callback(on_done)
+
+
+# TSV columns the OCR passes actually use
+_PASS_COLUMNS = ('block_num', 'par_num', 'line_num', 'conf', 'text')
+
+
+def _image_key(image):
+    """
+    Return a content hash for a numpy array or PIL image, including its
+    shape and type so equal bytes with a different layout don't collide.
+    """
+    if isinstance(image, np.ndarray):
+        data = np.ascontiguousarray(image).tobytes()
+        layout = (image.shape, image.dtype.str)
+    else:
+        data = image.tobytes()
+        layout = (image.size, image.mode)
+    
+    if xxhash is not None:
+        digest = xxhash.xxh3_64_intdigest(data)
+    else:
+        digest = hashlib.blake2b(data, digest_size=8).digest()
+    return digest, layout
+
 
 class OCRServiceAdvanced:
     """
@@ -21,6 +104,36 @@ class OCRServiceAdvanced:
             11,  # Sparse text (good for scattered text)
             12,  # Sparse text with OSD (orientation detection)
         ]
+        
+        # Stop as soon as a pass is at least this confident (percent)
+        self.early_exit_conf = 88.0
+        
+        # Images with a pixel standard deviation below this (or smaller than
+        # MIN_OCR_PIXELS) are treated as blank and not sent to Tesseract
+        self.blank_std_threshold = 5.0
+        
+        # Passes are independent tesseract subprocesses, so threads run them
+        # in parallel (the GIL is released while waiting). Each subprocess is
+        # single-threaded (see top of module) so the passes don't fight over cores.
+        self._pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        
+        # With tesserocr installed, passes borrow loaded engines from a pool
+        # instead of spawning subprocesses. Every engine holds its own copy of
+        # the language model (tens of MB), so at most max_engines are loaded;
+        # passes beyond that wait for a free engine.
+        self.use_tesserocr = PyTessBaseAPI is not None
+        self.max_engines = min(4, os.cpu_count() or 1)
+        self._engines = EnginePool('eng', self.max_engines)
+        
+        # Results of single passes keyed by (image hash, PSM), so retries on
+        # the same preprocessed image skip Tesseract (FIFO, shared by threads)
+        self.cache_size = 128
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Images per Tesseract process in batch mode; very long image lists
+        # have been seen to hang Tesseract
+        self.batch_size = 32
     
     def extract_text_robust(self, image, preprocessed_variations=None):
         """
@@ -33,22 +146,189 @@ class OCRServiceAdvanced:
         Returns:
             Best extracted text
         """
+        images = preprocessed_variations or {'default': image}
+        
+        # Convert every image to grayscale once and, for the Tesseract CLI,
+        # write it to a PNG once; all PSM passes then share that file instead
+        # of pytesseract re-encoding the image for each pass
+        tmp_dir = None if self.use_tesserocr else tempfile.mkdtemp(prefix='ocr_', dir=_TMP_DIR)
+        names, sources, keys = [], [], []
+        try:
+            for i, (method_name, img) in enumerate(images.items()):
+                if self._is_blank(img):
+                    logger.debug(f"Skipping blank variation {method_name}")
+                    continue
+                pil_image = _to_gray_pil(img)
+                keys.append(_image_key(pil_image))
+                if tmp_dir is None:
+                    sources.append(pil_image)
+                else:
+                    path = os.path.join(tmp_dir, f'{i}.png')
+                    pil_image.save(path, compress_level=1)
+                    sources.append(path)
+                names.append(method_name)
+            
+            # If we have multiple preprocessing variations, try them all
+            if not sources:
+                futures = []
+            elif preprocessed_variations and not self.use_tesserocr:
+                # One Tesseract process per PSM mode reads all variations from an
+                # image list, so the engine is loaded once instead of per image
+                futures = [self._pool.submit(self._batch_pass, sources, keys, names, psm)
+                           for psm in self.psm_modes]
+            else:
+                # Run all passes in parallel
+                futures = [
+                    self._pool.submit(self._ocr_single_pass, source, psm, method_name, key)
+                    for method_name, source, key in zip(names, sources, keys)
+                    for psm in self.psm_modes
+                ]
+        except Exception:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        
+        if tmp_dir is not None:
+            # Passes still running after an early exit keep reading the files
+            _remove_when_done(futures, tmp_dir)
+        
         results = []
+        for future in as_completed(futures):
+            # Batch passes return one result per variation
+            pass_results = future.result()
+            if not isinstance(pass_results, list):
+                pass_results = [pass_results]
+            
+            for result in pass_results:
+                if not result:
+                    continue
+                if result['confidence'] >= self.early_exit_conf:
+                    # Good enough; drop the passes that haven't started yet
+                    for f in futures:
+                        f.cancel()
+                    logger.info(f"Early exit with {result['method']} at {result['confidence']:.1f}% confidence")
+                    return result['text']
+                results.append(result)
         
-        # If we have multiple preprocessing variations, try them all
-        if preprocessed_variations:
-            for method_name, img in preprocessed_variations.items():
-                for psm in self.psm_modes:
-                    result = self._ocr_single_pass(img, psm, method_name)
-                    if result:
-                        results.append(result)
-        else:
-            # Just use the single image with different PSM modes
-            for psm in self.psm_modes:
-                result = self._ocr_single_pass(image, psm, 'default')
-                if result:
-                    results.append(result)
+        return self._best_text(results)
+    
+    async def extract_text_robust_async(self, image, preprocessed_variations=None):
+        """
+        Async version of extract_text_robust for callers already running an
+        event loop. Passes run as asyncio subprocesses (at most one per CPU at
+        a time) that read the PNG from stdin, so no pool thread blocks on them.
         
+        Args:
+            image: Primary preprocessed image
+            preprocessed_variations: Dict of alternative preprocessed images
+        
+        Returns:
+            Best extracted text
+        """
+        images = preprocessed_variations or {'default': image}
+        
+        # Grayscale conversion, hashing and PNG encoding happen once per image,
+        # off the event loop
+        def encode_all():
+            encoded = {}
+            for method_name, img in images.items():
+                if self._is_blank(img):
+                    logger.debug(f"Skipping blank variation {method_name}")
+                    continue
+                pil_image = _to_gray_pil(img)
+                buffer = io.BytesIO()
+                pil_image.save(buffer, format='PNG')
+                encoded[method_name] = (_image_key(pil_image), buffer.getvalue())
+            return encoded
+        
+        encoded = await asyncio.to_thread(encode_all)
+        
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        tasks = [
+            asyncio.create_task(
+                self._ocr_single_pass_async(png_bytes, image_key, psm, method_name, semaphore)
+            )
+            for method_name, (image_key, png_bytes) in encoded.items()
+            for psm in self.psm_modes
+        ]
+        
+        results = []
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                if not result:
+                    continue
+                if result['confidence'] >= self.early_exit_conf:
+                    logger.info(f"Early exit with {result['method']} at {result['confidence']:.1f}% confidence")
+                    return result['text']
+                results.append(result)
+        finally:
+            # Stop whatever is still running (this kills its tesseract process)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        return self._best_text(results)
+    
+    async def _ocr_single_pass_async(self, png_bytes, image_key, psm_mode, method_name, semaphore):
+        """
+        Run one Tesseract pass as an asyncio subprocess. Shares the result
+        cache with _ocr_single_pass.
+        """
+        key = (image_key, psm_mode)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return {**cached, 'method': f'{method_name}_psm{psm_mode}'}
+        
+        try:
+            async with semaphore:
+                process = await asyncio.create_subprocess_exec(
+                    pytesseract.pytesseract.tesseract_cmd, 'stdin', 'stdout',
+                    '--oem', '3', '--psm', str(psm_mode), '-l', 'eng', 'tsv',
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stdout, stderr = await process.communicate(png_bytes)
+                except asyncio.CancelledError:
+                    if process.returncode is None:
+                        process.kill()
+                        await process.wait()
+                    raise
+            
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode('utf-8', errors='replace').strip())
+            data = parse_tsv(stdout.decode('utf-8'), _PASS_COLUMNS)
+        except Exception as e:
+            logger.error(f"OCR pass failed for {method_name}_psm{psm_mode}: {str(e)}")
+            return None
+        
+        text, confidences, word_count = summarize_data(data)
+        result = {
+            'text': text,
+            'confidence': float(confidences.mean()) if confidences.size else 0.0,
+            'word_count': word_count,
+            'method': f'{method_name}_psm{psm_mode}'
+        }
+        self._cache_put(key, result)
+        return result
+    
+    def _is_blank(self, image):
+        """
+        True if a numpy image is too small or too flat to contain any text.
+        """
+        if not isinstance(image, np.ndarray):
+            return False
+        if image.size < MIN_OCR_PIXELS:
+            return True
+        _, std_dev = cv2.meanStdDev(image)
+        return float(std_dev.max()) < self.blank_std_threshold
+    
+    def _best_text(self, results):
+        """
+        Return the text of the most confident pass result ("" if none).
+        """
         if not results:
             logger.warning("No OCR results from any method")
             return ""
@@ -59,33 +339,139 @@ class OCRServiceAdvanced:
         
         return best['text']
     
-    def _ocr_single_pass(self, image, psm_mode, method_name):
+    def _ocr_single_pass(self, image, psm_mode, method_name, image_key=None):
         """
         Run OCR once with specific settings and return result with confidence.
+        Results are cached by image content (image_key, hashed from image if
+        not given) and PSM mode.
+        """
+        if image_key is None:
+            image_key = _image_key(image)
+        key = (image_key, psm_mode)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return {**cached, 'method': f'{method_name}_psm{psm_mode}'}
+        
+        result = self._run_single_pass(image, psm_mode, method_name)
+        if result:
+            self._cache_put(key, result)
+        return result
+    
+    def _cache_get(self, key):
+        with self._cache_lock:
+            return self._cache.get(key)
+    
+    def _cache_put(self, key, result):
+        # The method name depends on the caller, so it isn't cached
+        with self._cache_lock:
+            self._cache[key] = {k: v for k, v in result.items() if k != 'method'}
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def _batch_pass(self, paths, image_keys, names, psm_mode):
+        """
+        Run one PSM mode over several PNG files, batching the ones not cached yet.
+        
+        Returns:
+            List of result dicts in the order of paths (None for failed passes)
+        """
+        keys = [(image_key, psm_mode) for image_key in image_keys]
+        results = [self._cache_get(key) for key in keys]
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = self._batch_ocr([paths[i] for i in missing], psm_mode)
+            for i, result in zip(missing, fresh):
+                if result:
+                    self._cache_put(keys[i], result)
+                    results[i] = result
+        
+        return [
+            {**result, 'method': f'{name}_psm{psm_mode}'} if result else None
+            for result, name in zip(results, names)
+        ]
+    
+    def _batch_ocr(self, paths, psm_mode):
+        """
+        OCR several image files with one Tesseract process per batch_size chunk.
+        
+        Returns:
+            List of result dicts (text, confidence, word_count), one per file
+        """
+        results = []
+        for start in range(0, len(paths), self.batch_size):
+            results.extend(self._run_batch(paths[start:start + self.batch_size], psm_mode))
+        return results
+    
+    def _run_batch(self, paths, psm_mode):
+        """
+        Write an image-list file for paths to a temp dir and run Tesseract
+        once over the list with TSV output.
         """
         try:
-            # Convert numpy array to PIL Image
-            if isinstance(image, np.ndarray):
-                pil_image = Image.fromarray(image)
+            with tempfile.TemporaryDirectory(prefix='ocr_', dir=_TMP_DIR) as tmp_dir:
+                list_path = os.path.join(tmp_dir, 'list.txt')
+                with open(list_path, 'w') as f:
+                    f.write('\n'.join(paths) + '\n')
+                
+                output_base = os.path.join(tmp_dir, 'out')
+                subprocess.run(
+                    [pytesseract.pytesseract.tesseract_cmd, list_path, output_base,
+                     '--oem', '3', '--psm', str(psm_mode), '-l', 'eng', 'tsv'],
+                    check=True, capture_output=True
+                )
+                with open(output_base + '.tsv', encoding='utf-8') as f:
+                    data = parse_tsv(f.read(), ('page_num',) + _PASS_COLUMNS)
+        except Exception as e:
+            logger.error(f"Batch OCR failed for psm{psm_mode}: {str(e)}")
+            return [None] * len(paths)
+        
+        # Every image is one page of the combined output (page_num starts at 1)
+        pages = np.fromiter(data['page_num'], dtype=np.int32, count=len(data['page_num']))
+        
+        results = []
+        for page in range(1, len(paths) + 1):
+            rows = np.flatnonzero(pages == page)
+            page_data = {column: [data[column][i] for i in rows] for column in _PASS_COLUMNS}
+            text, confidences, word_count = summarize_data(page_data)
+            results.append({
+                'text': text,
+                'confidence': float(confidences.mean()) if confidences.size else 0.0,
+                'word_count': word_count
+            })
+        return results
+    
+    def _run_single_pass(self, image, psm_mode, method_name):
+        """
+        Run Tesseract for _ocr_single_pass (uncached). image is the grayscale
+        PIL image (tesserocr) or PNG path prepared by extract_text_robust.
+        """
+        try:
+            if self.use_tesserocr:
+                # In-process engine, already loaded
+                with self._engines.engine(psm_mode) as api:
+                    api.SetImage(image)
+                    text = api.GetUTF8Text()
+                    word_confidences = api.AllWordConfidences()
+                
+                confidences = positive_confidences(word_confidences)
+                word_count = len(word_confidences)
             else:
-                pil_image = image
-            
-            # Configure tesseract
-            config = f'--oem 3 --psm {psm_mode} -l eng'
-            
-            # Get text
-            text = pytesseract.image_to_string(pil_image, config=config)
-            
-            # Get confidence scores
-            data = pytesseract.image_to_data(pil_image, config=config, 
-                                            output_type=pytesseract.Output.DICT)
+                # Configure tesseract
+                config = f'--oem 3 --psm {psm_mode} -l eng'
+                
+                # Single Tesseract run for both text and confidence scores,
+                # parsing only the TSV columns used here. run_tesseract drops
+                # 'tsv' from the command line, so ask for TSV output the way
+                # image_to_data does.
+                tsv = pytesseract.run_and_get_output(
+                    image, 'tsv', config=f'-c tessedit_create_tsv=1 {config}'
+                )
+                data = parse_tsv(tsv, _PASS_COLUMNS)
+                text, confidences, word_count = summarize_data(data)
             
             # Calculate average confidence
-            confidences = [int(c) for c in data['conf'] if int(c) > 0]
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            # Count words detected
-            word_count = len([w for w in data['text'] if w.strip()])
+            avg_confidence = float(confidences.mean()) if confidences.size else 0.0
             
             return {
                 'text': text,
@@ -124,8 +510,8 @@ class OCRServiceAdvanced:
                 data = pytesseract.image_to_data(pil_image, config=config,
                                                 output_type=pytesseract.Output.DICT)
                 
-                confidences = [int(c) for c in data['conf'] if int(c) > 0]
-                avg_conf = sum(confidences) / len(confidences) if confidences else 0
+                confidences = positive_confidences(data['conf'])
+                avg_conf = float(confidences.mean()) if confidences.size else 0.0
                 
                 if avg_conf > best_confidence:
                     best_confidence = avg_conf
@@ -160,7 +546,17 @@ class OCRServiceAdvanced:
             else:
                 pil_image = image
             
-            text = pytesseract.image_to_string(pil_image, config=config)
+            if self.use_tesserocr:
+                with self._engines.engine(6) as api:
+                    api.SetVariable('tessedit_char_whitelist', whitelist_chars)
+                    try:
+                        api.SetImage(pil_image)
+                        text = api.GetUTF8Text()
+                    finally:
+                        # The engine is reused by other passes; drop the whitelist again
+                        api.SetVariable('tessedit_char_whitelist', '')
+            else:
+                text = pytesseract.image_to_string(pil_image, config=config)
             return text
             
         except Exception as e:
@@ -187,30 +583,23 @@ class OCRServiceAdvanced:
             
             # Group by blocks/paragraphs
             regions = []
-            current_block = {'text': [], 'bbox': None}
             
-            for i in range(len(data['text'])):
-                conf = int(data['conf'][i])
-                text = data['text'][i].strip()
-                
-                if conf > min_confidence and text:
-                    x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-                    
-                    current_block['text'].append(text)
-                    
-                    # Update bounding box
-                    if current_block['bbox'] is None:
-                        current_block['bbox'] = [x, y, x+w, y+h]
-                    else:
-                        current_block['bbox'][0] = min(current_block['bbox'][0], x)
-                        current_block['bbox'][1] = min(current_block['bbox'][1], y)
-                        current_block['bbox'][2] = max(current_block['bbox'][2], x+w)
-                        current_block['bbox'][3] = max(current_block['bbox'][3], y+h)
+            # Pick the confident, non-empty words with one vectorized mask
+            n = len(data['text'])
+            words = [t.strip() for t in data['text']]
+            confs = np.fromiter(data['conf'], dtype=np.int32, count=n)
+            mask = (confs > min_confidence) & np.fromiter(map(bool, words), dtype=bool, count=n)
             
-            if current_block['text']:
+            if mask.any():
+                left = np.fromiter(data['left'], dtype=np.int32, count=n)[mask]
+                top = np.fromiter(data['top'], dtype=np.int32, count=n)[mask]
+                right = left + np.fromiter(data['width'], dtype=np.int32, count=n)[mask]
+                bottom = top + np.fromiter(data['height'], dtype=np.int32, count=n)[mask]
+                
                 regions.append({
-                    'text': ' '.join(current_block['text']),
-                    'bbox': current_block['bbox']
+                    'text': ' '.join(w for w, keep in zip(words, mask) if keep),
+                    # Plain ints so the result stays JSON serializable
+                    'bbox': [int(left.min()), int(top.min()), int(right.max()), int(bottom.max())]
                 })
             
             return regions
@@ -233,30 +622,31 @@ class OCRServiceAdvanced:
             data = pytesseract.image_to_data(pil_image, config='--oem 3 --psm 6',
                                             output_type=pytesseract.Output.DICT)
             
+            confs = np.fromiter(data['conf'], dtype=np.int32, count=len(data['conf']))
+            texts, present = strip_words(data['text'])
+            
             words = []
-            for i in range(len(data['text'])):
-                text = data['text'][i].strip()
-                if text:
-                    words.append({
-                        'text': text,
-                        'confidence': int(data['conf'][i]),
-                        'bbox': {
-                            'x': data['left'][i],
-                            'y': data['top'][i],
-                            'width': data['width'][i],
-                            'height': data['height'][i]
-                        }
-                    })
+            for i in np.flatnonzero(present).tolist():
+                words.append({
+                    'text': str(texts[i]),
+                    'confidence': int(confs[i]),
+                    'bbox': {
+                        'x': data['left'][i],
+                        'y': data['top'][i],
+                        'width': data['width'][i],
+                        'height': data['height'][i]
+                    }
+                })
             
             # Calculate overall statistics
-            confidences = [w['confidence'] for w in words if w['confidence'] > 0]
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+            confidences = positive_confidences(confs[present])
+            avg_confidence = float(confidences.mean()) if confidences.size else 0.0
             
             return {
                 'words': words,
                 'total_words': len(words),
                 'average_confidence': round(avg_confidence, 2),
-                'full_text': ' '.join([w['text'] for w in words])
+                'full_text': ' '.join(texts[present].tolist())
             }
             
         except Exception as e:
@@ -0,0 +1,132 @@
+import os
+
+# Tesseract runs single-threaded: the OCR services parallelize across passes
+# themselves and its OpenMP threads would only compete for the same cores.
+# Set before tesserocr is imported so libtesseract reads it when it loads;
+# pytesseract's subprocesses inherit it from the environment.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+import csv
+import io
+import queue
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    # Optional in-process binding to libtesseract (pip install tesserocr)
+    from tesserocr import PyTessBaseAPI, PSM, OEM
+except ImportError:
+    PyTessBaseAPI = PSM = OEM = None
+
+
+class EnginePool:
+    """
+    Bounded pool of loaded tesserocr engines. PyTessBaseAPI is not
+    thread-safe, so each engine serves one pass at a time; the page
+    segmentation mode is set per pass, so one pool serves every PSM.
+    """
+    
+    def __init__(self, lang, size):
+        self.lang = lang
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def engine(self, psm_mode):
+        """
+        Borrow an engine set to psm_mode, waiting if all of them are busy.
+        """
+        api = self._acquire()
+        try:
+            api.SetPageSegMode(psm_mode)
+            yield api
+        finally:
+            self._idle.put(api)
+    
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        
+        try:
+            return PyTessBaseAPI(lang=self.lang, oem=OEM.DEFAULT)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+
+def positive_confidences(conf_values):
+    """
+    Return the word confidences above zero as an int32 array
+    (Tesseract reports -1 for non-word rows).
+    """
+    conf = np.fromiter(conf_values, dtype=np.int32, count=len(conf_values))
+    return conf[conf > 0]
+
+
+def parse_tsv(tsv, columns):
+    """
+    Read only the given columns from Tesseract TSV output into lists, like
+    image_to_data's DICT output without the unused columns. Every column
+    except text is converted to int.
+    """
+    rows = csv.reader(io.StringIO(tsv), delimiter='\t', quoting=csv.QUOTE_NONE)
+    header = next(rows, [])
+    data = {column: [] for column in columns}
+    if not header:
+        return data
+    
+    indexes = [(data[column], header.index(column), column == 'text') for column in columns]
+    for row in rows:
+        if not row:
+            continue
+        for values, index, is_text in indexes:
+            # A trailing empty text cell can be missing from the row
+            value = row[index] if index < len(row) else ''
+            values.append(value if is_text else int(float(value)))
+    return data
+
+
+def strip_words(texts):
+    """
+    Strip Tesseract's word column in one vectorized step.
+    
+    Returns:
+        (stripped words as a numpy string array, mask of the non-empty ones)
+    """
+    words = np.char.strip(np.asarray(texts, dtype=str))
+    return words, np.char.str_len(words) > 0
+
+
+def summarize_data(data):
+    """
+    Turn image_to_data style columns into (text, positive confidences, word count).
+    The text is rebuilt from the words, one output line per Tesseract line.
+    """
+    stripped, present = strip_words(data['text'])
+    
+    lines = {}
+    for block, par, line, word in zip(data['block_num'], data['par_num'],
+                                      data['line_num'], stripped.tolist()):
+        if word:
+            lines.setdefault((block, par, line), []).append(word)
+    text = '\n'.join(' '.join(words) for words in lines.values())
+    
+    confidences = positive_confidences(data['conf'])
+    
+    # Count words detected
+    word_count = int(np.count_nonzero(present))
+    return text, confidences, word_count
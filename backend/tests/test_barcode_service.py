@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import socket
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from barcode_service import BarcodeService, REDIS_TIMEOUT
+
+
+class BarcodeServiceRedisTest(unittest.TestCase):
+    """
+    Redis problems must turn into cache misses, not errors or hangs.
+    """
+    
+    def setUp(self):
+        # Accepts connections but never answers, like a stalled Redis
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen()
+        port = self.server.getsockname()[1]
+        self.service = BarcodeService(use_pyzbar_fallback=False, redis_url=f'redis://127.0.0.1:{port}/0')
+    
+    def tearDown(self):
+        self.service._redis.close()
+        self.server.close()
+    
+    def test_stalled_redis_is_a_miss(self):
+        start = time.monotonic()
+        self.assertIsNone(self.service._redis_get('8690504000000'))
+        self.service._redis_set('8690504000000', {'product_name': 'Su'})
+        self.assertLess(time.monotonic() - start, 10 * REDIS_TIMEOUT)
+    
+    def test_invalid_entry_is_a_miss(self):
+        with mock.patch.object(self.service._redis, 'get', return_value=b'\xff not json'):
+            self.assertIsNone(self.service._redis_get('8690504000000'))
+        with mock.patch.object(self.service._redis, 'get', return_value=b'null'):
+            self.assertIsNotNone(self.service._redis_get('8690504000000'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processor_advanced import ImageProcessorAdvanced
+
+
+def _label_image(width=2000, height=1500):
+    """
+    Dark text lines on a light background, roughly like a photographed label.
+    """
+    image = np.full((height, width, 3), 235, np.uint8)
+    scale = 1.5 * width / 2000
+    for y in range(int(60 * scale), height - 20, int(45 * scale)):
+        cv2.putText(image, 'Enerji 250 kcal Protein 5g Ingredients: wheat flour, salt',
+                    (20, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (30, 30, 30),
+                    max(1, int(2 * scale)), cv2.LINE_AA)
+    return image
+
+
+class CheckImageQualityTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.processor = ImageProcessorAdvanced()
+        self.image = _label_image()
+    
+    def test_sharp_image_passes(self):
+        quality = self.processor.check_image_quality(self.image)
+        self.assertNotIn("Image too blurry - hold camera steady and focus on text", quality['issues'])
+        self.assertEqual(quality['quality_score'], 100)
+    
+    def test_blurred_image_is_flagged(self):
+        # sigma 4 on a 2000 px photo; the full-size check flagged sigma >= 2
+        blurred = cv2.GaussianBlur(self.image, (0, 0), 4)
+        quality = self.processor.check_image_quality(blurred)
+        self.assertIn("Image too blurry - hold camera steady and focus on text", quality['issues'])
+        self.assertLessEqual(quality['quality_score'], 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def _jpeg(width, height):
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ok, encoded = cv2.imencode('.jpg', image)
+    return encoded.tobytes()
+
+
+class DecodeImageTest(unittest.TestCase):
+    
+    def test_large_photo_is_decoded_at_half_size_once(self):
+        with mock.patch.object(main.cv2, 'imdecode', wraps=cv2.imdecode) as imdecode:
+            image = main._decode_image(_jpeg(3200, 2400))
+        self.assertEqual(image.shape[:2], (1200, 1600))
+        self.assertEqual(imdecode.call_count, 1)
+    
+    def test_medium_photo_is_decoded_at_full_size_once(self):
+        with mock.patch.object(main.cv2, 'imdecode', wraps=cv2.imdecode) as imdecode:
+            image = main._decode_image(_jpeg(2000, 1500))
+        self.assertEqual(image.shape[:2], (1500, 2000))
+        self.assertEqual(imdecode.call_count, 1)
+    
+    def test_invalid_data(self):
+        self.assertIsNone(main._decode_image(b'not an image'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import os
+import sys
+import stat
+import shutil
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytesseract
+import tesseract_utils
+from ocr_service_advanced import OCRServiceAdvanced
+from tesseract_utils import EnginePool
+
+# Stand-in for the tesseract CLI. Like the real binary it only writes TSV when
+# asked to (the 'tsv' config file or -c tessedit_create_tsv=1) and plain text
+# otherwise. Every input page is recognized as the single word "page<N>".
+STUB_TESSERACT = r'''#!{python}
+import sys
+
+args = sys.argv[1:]
+if args == ['--version']:
+    print('tesseract 5.3.0')
+    sys.exit(0)
+
+source, output = args[0], args[1]
+options = args[2:]
+if source == 'stdin':
+    sys.stdin.buffer.read()
+    pages = 1
+elif source.endswith('.txt'):
+    with open(source) as f:
+        pages = len([line for line in f if line.strip()])
+else:
+    pages = 1
+
+if 'tsv' in options or 'tessedit_create_tsv=1' in options:
+    rows = ['level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext']
+    for page in range(1, pages + 1):
+        rows.append(f'1\t{{page}}\t0\t0\t0\t0\t0\t0\t40\t40\t-1\t')
+        rows.append(f'5\t{{page}}\t1\t1\t1\t1\t2\t3\t10\t8\t91.5\tpage{{page}}')
+    content, extension = '\n'.join(rows) + '\n', '.tsv'
+else:
+    content = ''.join(f'page{{page}}\n' for page in range(1, pages + 1))
+    extension = '.txt'
+
+if output == 'stdout':
+    sys.stdout.write(content)
+else:
+    with open(output + extension, 'w') as f:
+        f.write(content)
+'''
+
+
+class OCRServiceAdvancedStubTest(unittest.TestCase):
+    """
+    Runs the subprocess OCR paths against the stub tesseract above.
+    """
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        stub_path = os.path.join(self.tmp_dir, 'tesseract')
+        with open(stub_path, 'w') as f:
+            f.write(STUB_TESSERACT.format(python=sys.executable))
+        os.chmod(stub_path, os.stat(stub_path).st_mode | stat.S_IEXEC)
+        
+        self.original_cmd = pytesseract.pytesseract.tesseract_cmd
+        pytesseract.pytesseract.tesseract_cmd = stub_path
+        
+        self.ocr = OCRServiceAdvanced()
+        self.ocr.use_tesserocr = False
+        self.image = np.random.default_rng(0).integers(0, 256, (64, 64), dtype=np.uint8)
+    
+    def tearDown(self):
+        # Passes left running by an early exit still use the stub
+        self.ocr._pool.shutdown(wait=True)
+        pytesseract.pytesseract.tesseract_cmd = self.original_cmd
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def test_single_image_passes(self):
+        self.assertEqual(self.ocr.extract_text_robust(self.image), 'page1')
+        self.assertEqual(self.ocr.extract_text(self.image), 'page1')
+    
+    def test_single_pass_result(self):
+        result = self.ocr._ocr_single_pass(self.image, 6, 'default')
+        self.assertIsNotNone(result)
+        self.assertEqual(result['text'], 'page1')
+        self.assertEqual(result['word_count'], 1)
+        self.assertAlmostEqual(result['confidence'], 91.0)
+    
+    def test_batch_passes(self):
+        variations = {
+            'a': self.image,
+            'b': np.ascontiguousarray(self.image[::-1]),
+            'c': np.ascontiguousarray(self.image.T),
+        }
+        self.ocr.early_exit_conf = 101
+        self.assertEqual(self.ocr.extract_text_robust(None, variations), 'page1')
+        # One cached result per variation and PSM, split back from page_num
+        self.assertEqual(len(self.ocr._cache), len(variations) * len(self.ocr.psm_modes))
+        texts = sorted({result['text'] for result in self.ocr._cache.values()})
+        self.assertEqual(texts, ['page1', 'page2', 'page3'])
+    
+    def test_async_passes(self):
+        text = asyncio.run(self.ocr.extract_text_robust_async(self.image))
+        self.assertEqual(text, 'page1')
+    
+    def test_detailed_results_and_regions(self):
+        details = self.ocr.get_detailed_results(self.image)
+        self.assertEqual(details['full_text'], 'page1')
+        self.assertEqual(details['total_words'], 1)
+        
+        regions = self.ocr.extract_by_regions(self.image)
+        self.assertEqual(regions, [{'text': 'page1', 'bbox': [2, 3, 12, 11]}])
+    
+    def test_blank_image_is_skipped(self):
+        blank = np.full((64, 64), 255, np.uint8)
+        self.assertEqual(self.ocr.extract_text_robust(blank), '')
+
+
+
+class FakeEngine:
+    """
+    Stand-in for tesserocr.PyTessBaseAPI that records how many engines are
+    loaded and how many run at the same time.
+    """
+    
+    lock = threading.Lock()
+    created = 0
+    active = 0
+    max_active = 0
+    
+    def __init__(self, lang, oem):
+        with FakeEngine.lock:
+            FakeEngine.created += 1
+        self.psm = None
+    
+    def SetPageSegMode(self, psm):
+        self.psm = psm
+    
+    def SetVariable(self, name, value):
+        return True
+    
+    def SetImage(self, image):
+        with FakeEngine.lock:
+            FakeEngine.active += 1
+            FakeEngine.max_active = max(FakeEngine.max_active, FakeEngine.active)
+    
+    def GetUTF8Text(self):
+        threading.Event().wait(0.01)
+        with FakeEngine.lock:
+            FakeEngine.active -= 1
+        return f'psm{self.psm}'
+    
+    def AllWordConfidences(self):
+        return [90]
+
+
+class OCRServiceAdvancedEnginePoolTest(unittest.TestCase):
+    """
+    Runs the in-process passes against FakeEngine.
+    """
+    
+    def setUp(self):
+        FakeEngine.created = FakeEngine.active = FakeEngine.max_active = 0
+        patcher = mock.patch.multiple(tesseract_utils, PyTessBaseAPI=FakeEngine, OEM=mock.Mock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        self.ocr = OCRServiceAdvanced()
+        self.ocr.use_tesserocr = True
+        self.ocr.max_engines = 2
+        self.ocr._engines = EnginePool('eng', 2)
+        self.addCleanup(self.ocr._pool.shutdown, wait=True)
+        self.image = np.random.default_rng(0).integers(0, 256, (64, 64), dtype=np.uint8)
+    
+    def test_engines_are_bounded_and_shared_across_psms(self):
+        psm_modes = self.ocr.psm_modes * 4
+        results = list(self.ocr._pool.map(
+            lambda psm: self.ocr._run_single_pass(self.image, psm, 'default'), psm_modes
+        ))
+        
+        self.assertEqual([result['text'] for result in results], [f'psm{psm}' for psm in psm_modes])
+        self.assertLessEqual(FakeEngine.created, 2)
+        self.assertLessEqual(FakeEngine.max_active, 2)
+    
+    def test_whitelist_pass_uses_pool(self):
+        self.assertEqual(self.ocr.extract_with_whitelist(self.image), 'psm6')
+        self.assertEqual(FakeEngine.created, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
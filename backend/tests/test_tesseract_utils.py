@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tesseract_utils import parse_tsv, summarize_data
+
+TSV = (
+    'level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n'
+    '1\t1\t0\t0\t0\t0\t0\t0\t100\t50\t-1\t\n'
+    '5\t1\t1\t1\t1\t1\t2\t3\t10\t8\t95.4\tEnerji\n'
+    '5\t1\t1\t1\t1\t2\t14\t3\t10\t8\t85\t250\n'
+    '5\t1\t1\t1\t2\t1\t2\t13\t10\t8\t70\t kcal \n'
+    '5\t1\t1\t1\t2\t2\t14\t13\t10\t8\t-1\t'
+)
+
+
+class TesseractUtilsTest(unittest.TestCase):
+    
+    def test_parse_tsv_reads_requested_columns(self):
+        data = parse_tsv(TSV, ('line_num', 'conf', 'text'))
+        self.assertEqual(list(data), ['line_num', 'conf', 'text'])
+        self.assertEqual(data['line_num'], [0, 1, 1, 2, 2])
+        self.assertEqual(data['conf'], [-1, 95, 85, 70, -1])
+        # The last row's empty text cell is missing from the TSV
+        self.assertEqual(data['text'], ['', 'Enerji', '250', ' kcal ', ''])
+    
+    def test_parse_tsv_empty_output(self):
+        self.assertEqual(parse_tsv('', ('conf', 'text')), {'conf': [], 'text': []})
+    
+    def test_summarize_data_rebuilds_lines(self):
+        data = parse_tsv(TSV, ('block_num', 'par_num', 'line_num', 'conf', 'text'))
+        text, confidences, word_count = summarize_data(data)
+        self.assertEqual(text, 'Enerji 250\nkcal')
+        self.assertEqual(confidences.tolist(), [95, 85, 70])
+        self.assertEqual(word_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
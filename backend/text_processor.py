@@ -1,10 +1,35 @@
 import re
 import logging
+import ahocorasick
 from typing import Dict, List, Any
 
 logger = logging.getLogger(__name__)
 
 
+def _is_word_char(text: str, index: int) -> bool:
+    """
+    True if text[index] exists and is a regex word character (like \\w).
+    """
+    if index < 0 or index >= len(text):
+        return False
+    char = text[index]
+    return char.isalnum() or char == '_'
+
+
+class _CleanTable(dict):
+    """
+    str.translate table that deletes every character except word characters,
+    whitespace and .,:;-()%/ (same set as [\\w\\s.,:;\\-()%/]). Filled lazily,
+    one entry per code point seen, instead of covering all of Unicode.
+    """
+    
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        keep = char.isalnum() or char == '_' or char.isspace() or char in '.,:;-()%/'
+        value = self[codepoint] = codepoint if keep else None
+        return value
+
+
 class TextProcessor:
     """
     Handles post-processing of OCR text to extract structured food data.
@@ -12,25 +37,74 @@ class TextProcessor:
     
     def __init__(self):
         # Common patterns for nutritional information
-        self.calorie_patterns = [
+        self.calorie_patterns = [re.compile(p, re.IGNORECASE) for p in [
             r'calories?\s*:?\s*(\d+)',
             r'energy\s*:?\s*(\d+)\s*(?:kcal|cal)',
             r'(\d+)\s*(?:kcal|cal)',
             r'caloric\s+value\s*:?\s*(\d+)',
-        ]
+        ]]
         
         # Common patterns for serving size
-        self.serving_patterns = [
+        self.serving_patterns = [re.compile(p, re.IGNORECASE) for p in [
             r'serving\s+size\s*:?\s*([^\n]+)',
             r'portion\s*:?\s*([^\n]+)',
             r'per\s+(\d+\s*(?:g|ml|oz|cup))',
-        ]
+        ]]
         
         # Ingredient patterns
-        self.ingredient_patterns = [
+        self.ingredient_patterns = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in [
             r'ingredients?\s*:?\s*([^\n]+(?:\n(?![A-Z]{2,})[^\n]+)*)',
             r'contains?\s*:?\s*([^\n]+)',
+        ]]
+        
+        # Common nutritional components
+        self._nutrients = {
+            nutrient: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for nutrient, patterns in {
+                'protein': [r'protein\s*:?\s*(\d+\.?\d*)\s*g', r'proteins?\s*(\d+\.?\d*)'],
+                'fat': [r'(?:total\s+)?fat\s*:?\s*(\d+\.?\d*)\s*g', r'fats?\s*(\d+\.?\d*)'],
+                'carbohydrates': [r'(?:total\s+)?carbohydrate\s*:?\s*(\d+\.?\d*)\s*g', r'carbs?\s*(\d+\.?\d*)'],
+                'sugar': [r'sugars?\s*:?\s*(\d+\.?\d*)\s*g', r'sugar\s*(\d+\.?\d*)'],
+                'fiber': [r'(?:dietary\s+)?fiber\s*:?\s*(\d+\.?\d*)\s*g', r'fibre\s*(\d+\.?\d*)'],
+                'sodium': [r'sodium\s*:?\s*(\d+\.?\d*)\s*(?:mg|g)', r'salt\s*(\d+\.?\d*)'],
+            }.items()
+        }
+        
+        # Allergen detection
+        self.common_allergens = [
+            'milk', 'eggs', 'fish', 'shellfish', 'tree nuts', 'peanuts',
+            'wheat', 'soybeans', 'soy', 'gluten', 'sesame', 'mustard'
         ]
+        self._allergen_section_re = re.compile(
+            r'(?:contains?|allergens?|may contain)\s*:?\s*([^\n]+)', re.IGNORECASE
+        )
+        # All allergens are found in one pass over the text
+        self._allergen_ac = ahocorasick.Automaton()
+        for allergen in self.common_allergens:
+            self._allergen_ac.add_word(allergen, allergen)
+        self._allergen_ac.make_automaton()
+        
+        # Calorie, serving size and nutrient patterns fused into one regex so
+        # the text is scanned once (see _scan_fields). Each pattern sits in its
+        # own lookahead, so overlapping matches are all seen; at a given position
+        # only the first matching alternative is reported. Patterns are listed by
+        # field in priority order and no two fields' patterns can match at the
+        # same position, so every pattern still yields its leftmost match.
+        fields = [('calories', self.calorie_patterns), ('serving', self.serving_patterns)]
+        fields += list(self._nutrients.items())
+        self._fields_re = re.compile(
+            '|'.join(
+                f'(?=(?P<{field}_{priority}>{pattern.pattern}))'
+                for field, patterns in fields
+                for priority, pattern in enumerate(patterns)
+            ),
+            re.IGNORECASE
+        )
+        
+        # Text cleanup
+        self._whitespace_re = re.compile(r'\s+')
+        self._clean_table = _CleanTable()
+        self._ingredient_split_re = re.compile(r'[,;]')
     
     def extract_food_data(self, text: str) -> Dict[str, Any]:
         """
@@ -42,15 +116,19 @@ class TextProcessor:
         Returns:
             Dictionary containing extracted food information
         """
-        # Clean the text
+        # Clean the text; matching is case-insensitive, so lowercase it once
         cleaned_text = self._clean_text(text)
+        text_lower = cleaned_text.lower()
+        
+        # One pass for calories, serving size and nutrition facts
+        fields = self._scan_fields(text_lower)
         
         # Extract different components
-        calories = self._extract_calories(cleaned_text)
-        serving_size = self._extract_serving_size(cleaned_text)
+        calories = self._extract_calories(cleaned_text, fields)
+        serving_size = self._extract_serving_size(cleaned_text, fields)
         ingredients = self._extract_ingredients(cleaned_text)
-        nutrition_facts = self._extract_nutrition_facts(cleaned_text)
-        allergens = self._extract_allergens(cleaned_text)
+        nutrition_facts = self._extract_nutrition_facts(cleaned_text, fields)
+        allergens = self._extract_allergens(cleaned_text, text_lower)
         
         return {
             "calories": calories,
@@ -65,30 +143,44 @@ class TextProcessor:
         Clean and normalize OCR text.
         """
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = self._whitespace_re.sub(' ', text)
         # Remove special characters that might have been misread
-        text = re.sub(r'[^\w\s\.\,\:\;\-\(\)\%\/]', '', text)
+        text = text.translate(self._clean_table)
         return text.strip()
     
-    def _extract_calories(self, text: str) -> Dict[str, Any]:
+    def _scan_fields(self, text_lower: str) -> Dict[str, str]:
+        """
+        Run the fused calorie/serving/nutrient regex over lowercased text.
+        
+        Returns:
+            Dictionary of field name -> captured value, taken from the
+            highest-priority pattern of that field that matched
+        """
+        best = {}
+        for match in self._fields_re.finditer(text_lower):
+            field, _, priority = match.lastgroup.rpartition('_')
+            priority = int(priority)
+            # Keep the leftmost match of the highest-priority pattern
+            if field not in best or priority < best[field][0]:
+                best[field] = (priority, match.group(match.lastindex + 1))
+        
+        return {field: value for field, (_, value) in best.items()}
+    
+    def _extract_calories(self, text: str, fields: Dict[str, str] = None) -> Dict[str, Any]:
         """
         Extract calorie information.
         """
-        text_lower = text.lower()
+        if fields is None:
+            fields = self._scan_fields(text.lower())
         
-        for pattern in self.calorie_patterns:
-            match = re.search(pattern, text_lower, re.IGNORECASE)
-            if match:
-                try:
-                    calorie_value = int(match.group(1))
-                    logger.info(f"Found calories: {calorie_value}")
-                    return {
-                        "value": calorie_value,
-                        "unit": "kcal",
-                        "found": True
-                    }
-                except (ValueError, IndexError):
-                    continue
+        if 'calories' in fields:
+            calorie_value = int(fields['calories'])
+            logger.info(f"Found calories: {calorie_value}")
+            return {
+                "value": calorie_value,
+                "unit": "kcal",
+                "found": True
+            }
         
         logger.warning("No calorie information found")
         return {
@@ -97,21 +189,20 @@ class TextProcessor:
             "found": False
         }
     
-    def _extract_serving_size(self, text: str) -> Dict[str, Any]:
+    def _extract_serving_size(self, text: str, fields: Dict[str, str] = None) -> Dict[str, Any]:
         """
         Extract serving size information.
         """
-        text_lower = text.lower()
+        if fields is None:
+            fields = self._scan_fields(text.lower())
         
-        for pattern in self.serving_patterns:
-            match = re.search(pattern, text_lower, re.IGNORECASE)
-            if match:
-                serving = match.group(1).strip()
-                logger.info(f"Found serving size: {serving}")
-                return {
-                    "value": serving,
-                    "found": True
-                }
+        if 'serving' in fields:
+            serving = fields['serving'].strip()
+            logger.info(f"Found serving size: {serving}")
+            return {
+                "value": serving,
+                "found": True
+            }
         
         logger.warning("No serving size found")
         return {
@@ -124,11 +215,11 @@ class TextProcessor:
         Extract ingredients list.
         """
         for pattern in self.ingredient_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+            match = pattern.search(text)
             if match:
                 ingredients_text = match.group(1).strip()
                 # Split by comma or semicolon
-                ingredient_list = re.split(r'[,;]', ingredients_text)
+                ingredient_list = self._ingredient_split_re.split(ingredients_text)
                 ingredient_list = [ing.strip() for ing in ingredient_list if ing.strip()]
                 
                 logger.info(f"Found {len(ingredient_list)} ingredients")
@@ -145,75 +236,50 @@ class TextProcessor:
             "found": False
         }
     
-    def _extract_nutrition_facts(self, text: str) -> Dict[str, Any]:
+    def _extract_nutrition_facts(self, text: str, fields: Dict[str, str] = None) -> Dict[str, Any]:
         """
         Extract detailed nutrition facts.
         """
         nutrition = {}
-        text_lower = text.lower()
+        if fields is None:
+            fields = self._scan_fields(text.lower())
         
-        # Common nutritional components
-        nutrients = {
-            'protein': [r'protein\s*:?\s*(\d+\.?\d*)\s*g', r'proteins?\s*(\d+\.?\d*)'],
-            'fat': [r'(?:total\s+)?fat\s*:?\s*(\d+\.?\d*)\s*g', r'fats?\s*(\d+\.?\d*)'],
-            'carbohydrates': [r'(?:total\s+)?carbohydrate\s*:?\s*(\d+\.?\d*)\s*g', r'carbs?\s*(\d+\.?\d*)'],
-            'sugar': [r'sugars?\s*:?\s*(\d+\.?\d*)\s*g', r'sugar\s*(\d+\.?\d*)'],
-            'fiber': [r'(?:dietary\s+)?fiber\s*:?\s*(\d+\.?\d*)\s*g', r'fibre\s*(\d+\.?\d*)'],
-            'sodium': [r'sodium\s*:?\s*(\d+\.?\d*)\s*(?:mg|g)', r'salt\s*(\d+\.?\d*)'],
-        }
-        
-        for nutrient, patterns in nutrients.items():
-            for pattern in patterns:
-                match = re.search(pattern, text_lower, re.IGNORECASE)
-                if match:
-                    try:
-                        value = float(match.group(1))
-                        nutrition[nutrient] = {
-                            "value": value,
-                            "unit": "g" if nutrient != 'sodium' else "mg"
-                        }
-                        break
-                    except (ValueError, IndexError):
-                        continue
+        for nutrient in self._nutrients:
+            if nutrient in fields:
+                nutrition[nutrient] = {
+                    "value": float(fields[nutrient]),
+                    "unit": "g" if nutrient != 'sodium' else "mg"
+                }
         
         logger.info(f"Extracted nutrition facts for {len(nutrition)} nutrients")
         return nutrition
     
-    def _extract_allergens(self, text: str) -> Dict[str, Any]:
+    def _extract_allergens(self, text: str, text_lower: str = None) -> Dict[str, Any]:
         """
         Extract allergen information.
         """
-        text_lower = text.lower()
-        
-        common_allergens = [
-            'milk', 'eggs', 'fish', 'shellfish', 'tree nuts', 'peanuts',
-            'wheat', 'soybeans', 'soy', 'gluten', 'sesame', 'mustard'
-        ]
+        if text_lower is None:
+            text_lower = text.lower()
         
         found_allergens = []
         
         # Look for allergen declaration section
-        allergen_section = re.search(
-            r'(?:contains?|allergens?|may contain)\s*:?\s*([^\n]+)',
-            text_lower,
-            re.IGNORECASE
-        )
+        allergen_section = self._allergen_section_re.search(text_lower)
         
         if allergen_section:
             allergen_text = allergen_section.group(1)
-            for allergen in common_allergens:
-                if allergen in allergen_text:
-                    found_allergens.append(allergen)
+            for _, allergen in self._allergen_ac.iter(allergen_text):
+                found_allergens.append(allergen)
         
-        # Also check full text for allergen mentions
+        # Also check full text for allergen mentions (whole words only)
         else:
-            for allergen in common_allergens:
-                pattern = r'\b' + allergen + r'\b'
-                if re.search(pattern, text_lower):
+            for end, allergen in self._allergen_ac.iter(text_lower):
+                start = end - len(allergen) + 1
+                if not _is_word_char(text_lower, start - 1) and not _is_word_char(text_lower, end + 1):
                     found_allergens.append(allergen)
         
         logger.info(f"Found {len(found_allergens)} allergens")
         return {
-            "list": list(set(found_allergens)),  # Remove duplicates
+            "list": list(dict.fromkeys(found_allergens)),  # Remove duplicates, keep text order
             "found": len(found_allergens) > 0
         }